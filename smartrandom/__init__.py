@@ -15,6 +15,7 @@ Generates smart, recoverable passwords.
 
 """
 from .generators import (
+    CodeFormat,
     RandomLetterGenerator,
     RandomIntegerGenerator,
     RandomSymbolGenerator,
@@ -25,6 +26,8 @@ from .generators import (
     PasswordGenerator,
     SmartPasswordGenerator,
     SecretCodeGenerator,
+    CodeVerifier,
     RandomDataGenerator,
 )
+from .registry import CodeRegistry
 __version__ = '0.3.1'
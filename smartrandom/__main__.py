@@ -0,0 +1,59 @@
+# --------------------------------------------------------
+# Licensed under the terms of the BSD 3-Clause License
+# (see LICENSE for details).
+# Copyright © 2018-2024, A.A Suvorov
+# All rights reserved.
+# --------------------------------------------------------
+# https://github.com/smartlegionlab/
+# --------------------------------------------------------
+"""Command line interface."""
+import argparse
+import json
+
+from . import __version__
+from . import selftest
+
+
+def main(argv=None) -> int:
+    """
+    Runs the `smartrandom` command.
+
+    :param argv: Command line arguments (default is `sys.argv[1:]`).
+    :return: Exit status.
+    """
+    parser = argparse.ArgumentParser(prog='smartrandom', description='Random data generators.')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    commands = parser.add_subparsers(dest='command')
+    selftest_parser = commands.add_parser(
+        'selftest', help='check the uniformity and throughput of the generators')
+    selftest_parser.add_argument('-n', '--samples', type=int, default=10000,
+                                 help='number of samples per generator (default: 10000)')
+    selftest_parser.add_argument('-l', '--length', type=int, default=16,
+                                 help='length of every sample (default: 16)')
+    selftest_parser.add_argument('-w', '--workers', type=int, default=None,
+                                 help='number of worker processes (default: number of CPUs)')
+    selftest_parser.add_argument('-g', '--generator', action='append', dest='generators',
+                                 choices=sorted(selftest.GENERATORS), help='generator to test, may be repeated')
+    selftest_parser.add_argument('-o', '--output', help='path of the JSON report')
+    args = parser.parse_args(argv)
+
+    if args.command != 'selftest':
+        parser.print_help()
+        return 1
+    if args.samples < 1:
+        selftest_parser.error("the number of samples must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        selftest_parser.error("the number of workers must be at least 1")
+    if args.length < selftest.min_length(args.generators):
+        selftest_parser.error(f"the length must be at least {selftest.min_length(args.generators)} "
+                              f"for the selected generators")
+    report = selftest.run(args.samples, args.length, args.workers, args.generators)
+    print(selftest.format_report(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
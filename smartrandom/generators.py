@@ -7,7 +7,10 @@
 # https://github.com/smartlegionlab/
 # --------------------------------------------------------
 """Random Data Generators."""
+import array
+import functools
 import hashlib
+import hmac
 import os
 import random
 import re
@@ -15,6 +18,148 @@ import secrets
 import string
 
 
+class CodeFormat:
+    checks = ('luhn', 'damm')
+    damm_table = (
+        (0, 3, 1, 7, 5, 9, 8, 6, 4, 2),
+        (7, 0, 9, 2, 1, 5, 4, 8, 6, 3),
+        (4, 2, 0, 6, 8, 7, 1, 3, 5, 9),
+        (1, 7, 5, 0, 9, 8, 3, 4, 2, 6),
+        (6, 1, 2, 3, 0, 4, 5, 9, 7, 8),
+        (3, 6, 7, 4, 2, 0, 9, 5, 8, 1),
+        (5, 8, 6, 9, 7, 2, 0, 1, 3, 4),
+        (8, 9, 4, 5, 3, 6, 2, 0, 1, 7),
+        (9, 4, 3, 8, 6, 1, 7, 2, 0, 5),
+        (2, 5, 8, 1, 4, 3, 6, 7, 9, 0),
+    )
+
+    def __init__(self, group: int = 0, separator: str = '-', check: str = None):
+        """
+        Describes how generated codes are laid out.
+
+        For example, `CodeFormat(group=4, check='luhn')` turns 16 random characters
+        into `XXXX-XXXX-XXXX-XXXX-C`, where `C` is a Luhn mod N check character.
+
+        :param group: Number of characters per group, 0 disables grouping (default is 0).
+        :param separator: String placed between groups (default is '-').
+        :param check: Check character algorithm: 'luhn' (Luhn mod N, any alphabet),
+            'damm' (Damm, digits only) or None (default is None).
+        :raises ValueError: If group is negative or the check algorithm is unknown.
+        """
+        if group < 0:
+            raise ValueError("The group size cannot be negative.")
+        if check is not None and check not in self.checks:
+            raise ValueError(f"The check must be one of {self.checks}.")
+        self.group = group
+        self.separator = separator
+        self.check = check
+
+    def apply(self, chars: list, alphabet: str) -> str:
+        """
+        Appends the check character to the generated characters and splits them into groups.
+
+        The result is assembled in a single list preallocated with separators.
+
+        :param chars: Generated characters.
+        :param alphabet: Alphabet the characters were drawn from.
+        :return: Formatted code.
+        """
+        if self.check is not None:
+            chars.append(self.check_char(chars, alphabet))
+        if not self.group or not self.separator:
+            return ''.join(chars)
+        group, size = self.group, len(chars)
+        result = [self.separator] * (size + (size - 1) // group)
+        for i, char in enumerate(chars):
+            result[i + i // group] = char
+        return ''.join(result)
+
+    def check_char(self, chars, alphabet: str) -> str:
+        """
+        Calculates the check character for the given characters.
+
+        :param chars: Characters to protect.
+        :param alphabet: Alphabet the characters were drawn from.
+        :raises ValueError: If no check is configured or Damm is used with a non-decimal alphabet.
+        :return: Check character.
+        """
+        if self.check == 'luhn':
+            return alphabet[self._luhn(chars, alphabet, 2)]
+        if self.check == 'damm':
+            return alphabet[self._damm(chars, alphabet)]
+        raise ValueError("The format has no check character.")
+
+    def is_valid(self, code: str, alphabet: str) -> bool:
+        """
+        Checks the characters and the check character of a formatted code.
+
+        This does not touch any storage, so mistyped codes can be rejected before a lookup.
+
+        :param code: Formatted code.
+        :param alphabet: Alphabet the code was drawn from.
+        :return: True if the code is well-formed, otherwise False.
+        """
+        if self.separator:
+            code = code.replace(self.separator, '')
+        positions = self._positions(alphabet)
+        if not code or any(char not in positions for char in code):
+            return False
+        if self.check == 'luhn':
+            return self._luhn(code, alphabet, 1) == 0
+        if self.check == 'damm':
+            return self._damm(code, alphabet) == 0
+        return True
+
+    @classmethod
+    def _luhn(cls, chars, alphabet: str, factor: int) -> int:
+        """
+        Runs the Luhn mod N algorithm from the rightmost character.
+
+        :param chars: Characters to process.
+        :param alphabet: Alphabet of N characters.
+        :param factor: Factor of the rightmost character: 2 to calculate, 1 to validate.
+        :return: Check position when calculating, 0 for a valid code when validating.
+        """
+        positions = cls._positions(alphabet)
+        n = len(alphabet)
+        total = 0
+        for char in reversed(chars):
+            addend = factor * positions[char]
+            factor = 3 - factor
+            total += addend // n + addend % n
+        return (n - total % n) % n
+
+    @classmethod
+    def _damm(cls, chars, alphabet: str) -> int:
+        """
+        Runs the Damm algorithm.
+
+        :param chars: Characters to process.
+        :param alphabet: Alphabet of 10 characters.
+        :raises ValueError: If the alphabet does not have 10 characters.
+        :return: Check position when calculating, 0 for a valid code when validating.
+        """
+        if len(alphabet) != 10:
+            raise ValueError("The Damm check requires an alphabet of 10 characters.")
+        positions = cls._positions(alphabet)
+        table = cls.damm_table
+        interim = 0
+        for char in chars:
+            interim = table[interim][positions[char]]
+        return interim
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _positions(alphabet: str) -> dict:
+        """
+        Maps every character of the alphabet to its position.
+
+        :param alphabet: Alphabet to map.
+        :return: A dictionary of positions.
+        """
+        return {char: i for i, char in enumerate(alphabet)}
+
+
 class RandomLetterGenerator:
     upper_letters = string.ascii_uppercase
     lower_letters = string.ascii_lowercase
@@ -44,18 +189,32 @@ class RandomIntegerGenerator:
     digits = string.digits
 
     @classmethod
-    def generate(cls, length: int = 10) -> str:
+    def generate(cls, length: int = 10, code_format: CodeFormat = None) -> str:
         """
         Generates a string of random digits of the specified length.
 
         :param length: Length of the generated string.
+        :param code_format: Grouping and check digit to apply (default is None).
         :raises ValueError: If length is less than 1.
         :return: Random string of digits.
         """
         if length < 1:
             raise ValueError("The length must be at least 1.")
+        if code_format is not None:
+            return code_format.apply([secrets.choice(cls.digits) for _ in range(length)], cls.digits)
         return ''.join(secrets.choice(cls.digits) for _ in range(length))
 
+    @classmethod
+    def validate(cls, code: str, code_format: CodeFormat) -> bool:
+        """
+        Checks the digits and the check digit of a formatted code.
+
+        :param code: Code generated with the same format.
+        :param code_format: Format the code was generated with.
+        :return: True if the code is well-formed, otherwise False.
+        """
+        return code_format.is_valid(code, cls.digits)
+
 
 class RandomSymbolGenerator:
     symbols = '!@#$%&^_'
@@ -87,6 +246,20 @@ class HashGenerator:
         sha = hashlib.sha3_512(text.encode('utf-8'))
         return sha.hexdigest()
 
+    @classmethod
+    def generate_keyed(cls, text: str, key) -> str:
+        """
+        Generates an HMAC-SHA-3-512 hash for the given text.
+
+        :param text: Input text to hash.
+        :param key: Secret key, as a string or bytes.
+        :return: HMAC-SHA-3-512 hash of the input text.
+        """
+        text = str(text)
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        return hmac.new(key, text.encode('utf-8'), hashlib.sha3_512).hexdigest()
+
 
 class UrandomGenerator:
     @classmethod
@@ -111,7 +284,80 @@ class UrandomGenerator:
         return random_bytes.hex()
 
 
+class _VariantBitmap:
+    def __init__(self, total: int):
+        """
+        A set of variant numbers below `total`, stored as one bit per possible variant.
+
+        :param total: Number of possible variants.
+        """
+        self.bits = bytearray((total + 7) // 8)
+
+    def add(self, value: int) -> bool:
+        """
+        Adds a variant number.
+
+        :param value: Variant number.
+        :return: True if the number was not in the set before, otherwise False.
+        """
+        byte, bit = value >> 3, 1 << (value & 7)
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        return True
+
+
+class _VariantTable:
+    mask = (1 << 64) - 1
+
+    def __init__(self, size: int):
+        """
+        A set of variant numbers stored as 64-bit fingerprints in an open-addressing table.
+
+        The table has a power-of-two number of slots, at least twice `size`, so it takes at most
+        32 bytes per variant. Variant numbers below 2**64 - 1 are stored exactly; for larger ones two
+        variants may share a fingerprint, in which case the second one is treated as already seen.
+
+        :param size: Maximum number of variants that will be added.
+        """
+        self.slots = array.array('Q', bytes(8 * self.slot_count(size)))
+        self.bits = len(self.slots).bit_length() - 1
+
+    @staticmethod
+    def slot_count(size: int) -> int:
+        """
+        Returns the number of slots of a table for the given number of variants.
+
+        :param size: Maximum number of variants that will be added.
+        :return: Number of slots.
+        """
+        return 1 << max(1, (2 * size - 1).bit_length())
+
+    def add(self, value: int) -> bool:
+        """
+        Adds a variant number.
+
+        :param value: Variant number.
+        :return: True if the number was not in the set before, otherwise False.
+        """
+        fingerprint = value % self.mask + 1
+        slots = self.slots
+        last = len(slots) - 1
+        slot = ((fingerprint * 0x9E3779B97F4A7C15) & self.mask) >> (64 - self.bits)
+        while True:
+            current = slots[slot]
+            if not current:
+                slots[slot] = fingerprint
+                return True
+            if current == fingerprint:
+                return False
+            slot = (slot + 1) & last
+
+
 class TextRandomizer:
+    pattern = r"{(.+?)}"
+    max_misses = 1000000
+
     @classmethod
     def randomize(cls, text: str) -> str:
         """
@@ -129,20 +375,178 @@ class TextRandomizer:
         :param text: The input text containing patterns to be randomized.
         :return: The randomized text with patterns replaced by randomly selected options.
         """
-        return re.sub(r"{(.+?)}", lambda x: secrets.choice(x.group(1).split("|")), text)
+        return re.sub(cls.pattern, lambda x: secrets.choice(x.group(1).split("|")), text)
+
+    @classmethod
+    def count_variants(cls, text: str) -> int:
+        """
+        Counts the distinct variants the input text can produce, without enumerating them.
+
+        The result is the product of the number of distinct options in every pattern, so
+        repeated options (for example `{Hi|Hi|Hello}`) are counted once. It is exact when no
+        option of a pattern is a prefix of another option of the same pattern. Otherwise
+        different combinations may render the same text (for example `{a|ab}{bc|c}`), and
+        the result is an upper bound.
+
+        :param text: The input text containing patterns to be randomized.
+        :return: Number of distinct variants.
+        """
+        _, groups = cls._parse(text, distinct=True)
+        return cls._combinations(groups)
+
+    @classmethod
+    def render_to(cls, text: str, n: int, fileobj, unique: bool = False, sep: str = '\n',
+                  chunk_size: int = 65536) -> int:
+        """
+        Renders the input text `n` times and writes every variant, followed by `sep`, to a file.
+
+        The text is parsed once. Each variant is encoded as a single integer below the number
+        of option combinations, whose mixed-radix digits are the option indices of the patterns.
+        Those integers are drawn for a whole chunk of renders from one `os.urandom` block,
+        and every chunk is written to `fileobj` with a single `write` call.
+
+        With `unique`, repeated options of a pattern are dropped and the drawn variant numbers
+        are tracked in a bitmap of `count_variants(text) / 8` bytes, or, if that would be larger,
+        in an open-addressing table of 64-bit slots taking at most `32 * n` bytes (about 1 GiB
+        for 50M variants). If an option of a pattern is a prefix of another option of the same
+        pattern, different numbers may render the same text, so 64-bit hashes of the rendered
+        text are tracked in another such table as well. For those texts `count_variants` is only
+        an upper bound, and a `ValueError` is raised once all combinations were drawn, or, for
+        more than `2 ** 27` combinations, after `max_misses` draws in a row rendered no new text.
+
+        :param text: The input text containing patterns to be randomized.
+        :param n: Number of variants to write.
+        :param fileobj: Text file-like object to write the variants to.
+        :param unique: Write only distinct variants.
+        :param sep: String written after every variant (default is a newline).
+        :param chunk_size: Number of variants rendered per write (default is 65536).
+        :raises ValueError: If n is negative, chunk_size is less than 1, or `unique` is set and
+            the text cannot produce n distinct variants.
+        :return: Number of variants written.
+        """
+        if n < 0:
+            raise ValueError("The number of variants cannot be negative.")
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be at least 1.")
+        literals, groups = cls._parse(text, distinct=unique)
+        total = cls._combinations(groups)
+        if unique and n > total:
+            raise ValueError(f"The text can produce only {total} distinct variants, {n} requested.")
+
+        width = max(1, (total.bit_length() + 7) // 8 + 1)
+        limit = (1 << (8 * width)) // total * total
+        seen = texts = None
+        if unique:
+            ambiguous = not cls._prefix_free(groups)
+            if (total + 7) // 8 <= 8 * _VariantTable.slot_count(n) or (ambiguous and total <= 1 << 27):
+                seen = _VariantBitmap(total)
+            elif not ambiguous:
+                seen = _VariantTable(n)
+            if ambiguous:
+                texts = _VariantTable(n)
+        drawn = misses = 0
+        written = 0
+        while written < n:
+            count = min(chunk_size, n - written)
+            block = os.urandom(count * width)
+            out = []
+            rendered = 0
+            for offset in range(0, len(block), width):
+                value = int.from_bytes(block[offset:offset + width], 'big')
+                value = value % total if value < limit else secrets.randbelow(total)
+                if seen is not None:
+                    if not seen.add(value):
+                        if texts is not None and drawn == total:
+                            raise ValueError(f"The text can produce only {written + rendered} "
+                                             f"distinct variants, {n} requested.")
+                        continue
+                    drawn += 1
+                variant = [literals[0]]
+                for options, literal in zip(groups, literals[1:]):
+                    value, index = divmod(value, len(options))
+                    variant.append(options[index])
+                    variant.append(literal)
+                if texts is not None:
+                    variant = ''.join(variant)
+                    digest = hashlib.blake2b(variant.encode('utf-8'), digest_size=8).digest()
+                    if not texts.add(int.from_bytes(digest, 'big')):
+                        misses += 1
+                        if drawn == total:
+                            raise ValueError(f"The text can produce only {written + rendered} "
+                                             f"distinct variants, {n} requested.")
+                        if seen is None and misses > cls.max_misses:
+                            raise ValueError(f"Could not find more than {written + rendered} "
+                                             f"distinct variants, {n} requested.")
+                        continue
+                    misses = 0
+                    out.append(variant)
+                else:
+                    out += variant
+                out.append(sep)
+                rendered += 1
+            if rendered:
+                fileobj.write(''.join(out))
+                written += rendered
+        return written
+
+    @classmethod
+    def _parse(cls, text: str, distinct: bool = False):
+        """
+        Splits the input text into literal parts and pattern options.
+
+        :param text: The input text containing patterns to be randomized.
+        :param distinct: Drop repeated options of a pattern (default is False).
+        :return: A list of literal parts and a list of option lists, one shorter than the literals.
+        """
+        parts = re.split(cls.pattern, text)
+        groups = [part.split("|") for part in parts[1::2]]
+        if distinct:
+            groups = [list(dict.fromkeys(options)) for options in groups]
+        return parts[::2], groups
+
+    @staticmethod
+    def _prefix_free(groups) -> bool:
+        """
+        Checks that no option of a pattern is a prefix of another option of the same pattern.
+
+        Then every rendered text determines the options it was rendered from.
+
+        :param groups: Option lists returned by `_parse`.
+        :return: True if the options of every pattern are prefix-free, otherwise False.
+        """
+        for options in groups:
+            options = sorted(options)
+            if any(b.startswith(a) for a, b in zip(options, options[1:])):
+                return False
+        return True
+
+    @staticmethod
+    def _combinations(groups) -> int:
+        """
+        Multiplies the number of options of every pattern.
+
+        :param groups: Option lists returned by `_parse`.
+        :return: Number of option combinations.
+        """
+        total = 1
+        for options in groups:
+            total *= len(options)
+        return total
 
 
 class SecretCodeGenerator:
     upper_letters = string.ascii_uppercase
     lower_letters = string.ascii_lowercase
     digits = string.digits
+    alphabet = upper_letters + lower_letters + digits
 
     @classmethod
-    def generate(cls, length: int = 10) -> str:
+    def generate(cls, length: int = 10, code_format: CodeFormat = None) -> str:
         """
         Generates a random string containing uppercase letters, lowercase letters, and digits.
 
-        :param length: Length of the generated string.
+        :param length: Length of the generated string, without the check character and separators.
+        :param code_format: Grouping and check character to apply (default is None).
         :raises ValueError: If length is less than 3.
         :return: Random string of letters and digits.
         """
@@ -154,11 +558,110 @@ class SecretCodeGenerator:
             secrets.choice(cls.digits),
         ]
         result += [
-            secrets.choice(cls.upper_letters + cls.lower_letters + cls.digits) for _ in range(length - 3)
+            secrets.choice(cls.alphabet) for _ in range(length - 3)
         ]
         secrets.SystemRandom().shuffle(result)
+        if code_format is not None:
+            return code_format.apply(result, cls.alphabet)
         return ''.join(result)
 
+    @classmethod
+    def validate(cls, code: str, code_format: CodeFormat) -> bool:
+        """
+        Checks the characters and the check character of a formatted code.
+
+        :param code: Code generated with the same format.
+        :param code_format: Format the code was generated with.
+        :return: True if the code is well-formed, otherwise False.
+        """
+        return code_format.is_valid(code, cls.alphabet)
+
+
+class CodeVerifier:
+    separators = ' -'
+
+    @classmethod
+    def verify(cls, expected: str, provided: str, ignore_case: bool = False, separators: str = None) -> bool:
+        """
+        Compares an issued code with a provided one in constant time.
+
+        Both codes are normalized in a single `str.translate` pass with a cached table,
+        which removes separators and, if requested, folds ASCII letters to lowercase.
+
+        :param expected: The issued code.
+        :param provided: The code to check.
+        :param ignore_case: Compare letters case-insensitively (default is False).
+        :param separators: Characters to ignore (default is space and hyphen).
+        :return: True if the codes match, otherwise False.
+        """
+        table = cls._table(cls.separators if separators is None else separators, ignore_case)
+        return hmac.compare_digest(
+            str(expected).translate(table).encode('utf-8'),
+            str(provided).translate(table).encode('utf-8'),
+        )
+
+    @classmethod
+    def verify_many(cls, pairs, ignore_case: bool = False, separators: str = None) -> list:
+        """
+        Compares pairs of issued and provided codes in constant time.
+
+        :param pairs: Iterable of `(expected, provided)` pairs.
+        :param ignore_case: Compare letters case-insensitively (default is False).
+        :param separators: Characters to ignore (default is space and hyphen).
+        :return: A list with the result of every comparison.
+        """
+        table = cls._table(cls.separators if separators is None else separators, ignore_case)
+        compare_digest = hmac.compare_digest
+        return [
+            compare_digest(str(expected).translate(table).encode('utf-8'),
+                           str(provided).translate(table).encode('utf-8'))
+            for expected, provided in pairs
+        ]
+
+    @classmethod
+    def hash(cls, code: str, key, ignore_case: bool = False, separators: str = None) -> str:
+        """
+        Normalizes a code and generates its keyed hash, so that only the hash has to be stored.
+
+        :param code: The issued code.
+        :param key: Secret key, as a string or bytes.
+        :param ignore_case: Fold letters to lowercase before hashing (default is False).
+        :param separators: Characters to ignore (default is space and hyphen).
+        :return: HMAC-SHA-3-512 hash of the normalized code.
+        """
+        table = cls._table(cls.separators if separators is None else separators, ignore_case)
+        return HashGenerator.generate_keyed(str(code).translate(table), key)
+
+    @classmethod
+    def verify_hash(cls, expected_hash: str, provided: str, key, ignore_case: bool = False,
+                    separators: str = None) -> bool:
+        """
+        Compares a stored keyed hash with the hash of a provided code in constant time.
+
+        :param expected_hash: Hash of the issued code, as returned by `hash`.
+        :param provided: The code to check.
+        :param key: Secret key the hash was generated with.
+        :param ignore_case: Compare letters case-insensitively (default is False).
+        :param separators: Characters to ignore (default is space and hyphen).
+        :return: True if the code matches the hash, otherwise False.
+        """
+        provided_hash = cls.hash(provided, key, ignore_case, separators)
+        return hmac.compare_digest(str(expected_hash).encode('utf-8'), provided_hash.encode('utf-8'))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _table(separators: str, ignore_case: bool) -> dict:
+        """
+        Builds the translation table used to normalize codes.
+
+        :param separators: Characters to remove.
+        :param ignore_case: Map uppercase ASCII letters to lowercase.
+        :return: A table for `str.translate`.
+        """
+        table = str.maketrans(string.ascii_uppercase, string.ascii_lowercase) if ignore_case else {}
+        table.update(dict.fromkeys(map(ord, separators)))
+        return table
+
 
 class BasePasswordGenerator:
     letters = string.ascii_letters
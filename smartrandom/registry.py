@@ -0,0 +1,468 @@
+# --------------------------------------------------------
+# Licensed under the terms of the BSD 3-Clause License
+# (see LICENSE for details).
+# Copyright © 2018-2024, A.A Suvorov
+# All rights reserved.
+# --------------------------------------------------------
+# https://github.com/smartlegionlab/
+# --------------------------------------------------------
+"""Persistent registry of issued codes."""
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .generators import SecretCodeGenerator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+
+class CodeRegistry:
+    """
+    Append-only on-disk registry of issued codes.
+
+    Every `issue` and `redeem` is appended to a log file as a fixed-width record and
+    kept in memory. Lookups check those unmerged records first, then binary search
+    a sorted, memory-mapped index file.
+
+    Once `compact_threshold` records, and at least `1 / compact_ratio` of the index size,
+    are unmerged, a background thread compacts the registry: the log is renamed to `<path>.old` and a new log is started, the unmerged
+    records are merged with the old index into a new index file, which replaces the old
+    one, and `<path>.old` is removed. Requests keep being served from memory and the old
+    index until the new index is in place. Because the trigger grows with the index, every
+    record is rewritten about `compact_ratio` times in total, and memory holds at most about
+    `1 / compact_ratio` of the index in unmerged records.
+
+    Files:
+    - `<path>`: the log, a header followed by `(code, timestamp, kind)` records.
+    - `<path>.old`: the log being merged by a compaction, if any.
+    - `<path>.idx`: the index, a header followed by sorted `(code, issued_at, redeemed_at)` records.
+    - `<path>.lock`: locked exclusively while the registry is open, with `flock` on POSIX
+      and `msvcrt.locking` on Windows.
+
+    Concurrency: only one `CodeRegistry` may have a path open at a time, in any process;
+    opening a path that is already open raises `RuntimeError`. A single instance is safe to
+    share between threads. Services with several worker processes must route `issue` and
+    `redeem` through one process or give every worker its own path.
+
+    On Windows, open files cannot be renamed, so the log and the index are closed for the
+    moment they are replaced, and the directory is not fsynced, as Windows does not support it.
+    """
+    log_magic = b'SRLG'
+    index_magic = b'SRIX'
+    version = 1
+    issued = 0
+    redeemed = 1
+    compact_ratio = 8
+
+    def __init__(self, path: str, width: int = 32, compact_threshold: int = 4096, sync: bool = True):
+        """
+        Opens the registry at the given path, creating it if it does not exist.
+
+        A record torn by a crash during an append is dropped from the end of the log.
+
+        :param path: Path of the log file. The index is stored next to it with an `.idx` suffix.
+        :param width: Maximum length of a code in bytes (default is 32).
+        :param compact_threshold: Minimum number of unmerged records that triggers a background
+            compaction (default is 4096).
+        :param sync: Call `fsync` after every append (default is True).
+        :raises ValueError: If width or compact_threshold is less than 1, or the files were created
+            with a different width.
+        :raises RuntimeError: If the registry is already open by another `CodeRegistry`.
+        """
+        if width < 1:
+            raise ValueError("The width must be at least 1.")
+        if compact_threshold < 1:
+            raise ValueError("The compaction threshold must be at least 1.")
+        self.path = path
+        self.index_path = path + '.idx'
+        self.old_path = path + '.old'
+        self.width = width
+        self.compact_threshold = compact_threshold
+        self.sync = sync
+        self._log_header = struct.Struct('>4sHH')
+        self._log_record = struct.Struct(f'>{width}sdB')
+        self._index_header = struct.Struct('>4sHHQ')
+        self._index_record = struct.Struct(f'>{width}sdd')
+        self._lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._compactor = None
+        self._pending = {}
+        self._index_file = None
+        self._index_map = None
+        self._index_count = 0
+        self._fd = None
+        self._lock_fd = self._acquire()
+        try:
+            self._fd = self._open_log()
+            self._open_index()
+            recover = os.path.exists(self.old_path)
+            if recover:
+                self._replay(self.old_path, self._log_header.size)
+            self._replay(self.path, self._log_header.size)
+            if recover:
+                self._merge(dict(self._pending))
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            new = sum(1 for code in self._pending if self._find(code) is None)
+            return self._index_count + new
+
+    def issue(self, code: str = '', length: int = 10) -> str:
+        """
+        Registers an issued code.
+
+        :param code: Code to register. If empty, a new code is generated by `SecretCodeGenerator`.
+        :param length: Length of the generated code (default is 10).
+        :raises ValueError: If the code is longer than the registry width or was already issued.
+        :return: The registered code.
+        """
+        with self._lock:
+            if not code:
+                code = SecretCodeGenerator.generate(length)
+                while self._lookup(self._encode(code)) is not None:
+                    code = SecretCodeGenerator.generate(length)
+            key = self._encode(code)
+            if self._lookup(key) is not None:
+                raise ValueError(f"The code {code!r} has already been issued.")
+            now = time.time()
+            self._append(key, now, self.issued)
+            self._pending[key] = (now, 0.0)
+            self._maybe_compact()
+        return code
+
+    def contains(self, code: str) -> bool:
+        """
+        Checks whether the code was issued.
+
+        :param code: Code to look up.
+        :return: True if the code was issued, otherwise False.
+        """
+        return self.issued_at(code) is not None
+
+    def issued_at(self, code: str):
+        """
+        Returns the time the code was issued.
+
+        :param code: Code to look up.
+        :return: Issue timestamp in seconds since the epoch, or None if the code was not issued.
+        """
+        entry = self._get(code)
+        return entry[0] if entry is not None else None
+
+    def redeemed_at(self, code: str):
+        """
+        Returns the time the code was redeemed.
+
+        :param code: Code to look up.
+        :return: Redemption timestamp in seconds since the epoch, or None if the code was not redeemed.
+        """
+        entry = self._get(code)
+        return (entry[1] or None) if entry is not None else None
+
+    def redeem(self, code: str) -> bool:
+        """
+        Marks an issued code as redeemed.
+
+        :param code: Code to redeem.
+        :return: True if the code was issued and not redeemed before, otherwise False.
+        """
+        try:
+            key = self._encode(code)
+        except ValueError:
+            return False
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None or entry[1]:
+                return False
+            now = time.time()
+            self._append(key, now, self.redeemed)
+            self._pending[key] = (entry[0], now)
+            self._maybe_compact()
+        return True
+
+    def compact(self):
+        """
+        Merges the unmerged records into the sorted index in the calling thread.
+
+        Only the log rotation and the final index swap hold the registry lock, so
+        `issue`, `redeem` and lookups are served while the new index is written.
+        The new index is written to a temporary file, fsynced and atomically renamed over the
+        old one, and the directory is fsynced before `<path>.old` is removed, so a crash leaves
+        either the old index and `<path>.old`, or the new index. A leftover `<path>.old` is
+        replayed and merged again when the registry is next opened, which is harmless.
+        """
+        with self._compaction_lock:
+            with self._lock:
+                if not self._pending or self._fd is None:
+                    return
+                self._rotate()
+                snapshot = dict(self._pending)
+            self._merge(snapshot)
+
+    def close(self):
+        """Waits for a running compaction, then closes the log and the index."""
+        with self._compaction_lock, self._lock:
+            self._close_index()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def _acquire(self) -> int:
+        """Opens the lock file and takes an exclusive lock on it."""
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:  # pragma: no cover
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            raise RuntimeError(f"The registry {self.path!r} is already open.") from None
+        return fd
+
+    def _get(self, code: str):
+        """Looks up a code, treating codes that cannot be stored as missing."""
+        try:
+            key = self._encode(code)
+        except ValueError:
+            return None
+        with self._lock:
+            return self._lookup(key)
+
+    def _encode(self, code: str) -> bytes:
+        """Encodes a code into a fixed-width, NUL-padded key."""
+        key = str(code).encode('utf-8')
+        if not key or len(key) > self.width or b'\0' in key:
+            raise ValueError(f"The code must be 1 to {self.width} bytes long without NUL characters.")
+        return key.ljust(self.width, b'\0')
+
+    def _lookup(self, key: bytes):
+        """Looks up a key in the unmerged records, then in the index."""
+        entry = self._pending.get(key)
+        if entry is not None:
+            return entry
+        return self._find(key)
+
+    def _find(self, key: bytes):
+        """Binary searches the memory-mapped index for a key."""
+        position = self._position(key, self._index_map, self._index_count)
+        if position < self._index_count:
+            start = self._index_header.size + position * self._index_record.size
+            if self._index_map[start:start + self.width] == key:
+                _, issued_at, redeemed_at = self._index_record.unpack_from(self._index_map, start)
+                return issued_at, redeemed_at
+        return None
+
+    def _position(self, key: bytes, index_map, count: int) -> int:
+        """Returns the position of the first index record whose code is not less than the key."""
+        lo, hi = 0, count
+        size = self._index_record.size
+        offset = self._index_header.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * size
+            if index_map[start:start + self.width] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _append(self, key: bytes, timestamp: float, kind: int):
+        """Appends a single record to the log."""
+        os.write(self._fd, self._log_record.pack(key, timestamp, kind))
+        if self.sync:
+            os.fsync(self._fd)
+
+    def _maybe_compact(self):
+        """Starts a background compaction once enough records are unmerged."""
+        threshold = max(self.compact_threshold, self._index_count // self.compact_ratio)
+        if len(self._pending) >= threshold and self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_in_background, daemon=True)
+            self._compactor.start()
+
+    def _compact_in_background(self):
+        """Runs a compaction and allows the next one to start."""
+        try:
+            self.compact()
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    def _rotate(self):
+        """Moves the log to `<path>.old` and starts a new one."""
+        os.close(self._fd)
+        try:
+            os.replace(self.path, self.old_path)
+        except OSError:
+            self._fd = self._open_log()
+            raise
+        self._fd = self._create_log()
+        self._sync_directory()
+
+    def _create_log(self) -> int:
+        """Creates an empty log."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o600)
+        os.write(fd, self._log_header.pack(self.log_magic, self.version, self.width))
+        os.fsync(fd)
+        return fd
+
+    def _open_log(self) -> int:
+        """Opens or creates the log and drops a torn record from its end."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        size = os.fstat(fd).st_size
+        header_size = self._log_header.size
+        if size < header_size:
+            os.close(fd)
+            return self._create_log()
+        os.lseek(fd, 0, os.SEEK_SET)
+        magic, version, width = self._log_header.unpack(os.read(fd, header_size))
+        if magic != self.log_magic or version != self.version:
+            os.close(fd)
+            raise ValueError(f"{self.path!r} is not a code registry log.")
+        if width != self.width:
+            os.close(fd)
+            raise ValueError(f"{self.path!r} was created with width {width}, not {self.width}.")
+        torn = (size - header_size) % self._log_record.size
+        if torn:
+            os.ftruncate(fd, size - torn)
+            os.fsync(fd)
+        return fd
+
+    def _open_index(self):
+        """Maps the index, if it exists."""
+        try:
+            index_file = open(self.index_path, 'rb')
+        except FileNotFoundError:
+            return
+        header = index_file.read(self._index_header.size)
+        magic, version, width, count = self._index_header.unpack(header)
+        if magic != self.index_magic or version != self.version or width != self.width:
+            index_file.close()
+            raise ValueError(f"{self.index_path!r} does not match the registry log.")
+        self._index_file = index_file
+        self._index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index_count = count
+
+    def _close_index(self):
+        """Unmaps and closes the index."""
+        if self._index_map is not None:
+            self._index_map.close()
+            self._index_map = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+        self._index_count = 0
+
+    def _replay(self, path: str, offset: int):
+        """Loads the records of a log from the given offset into memory."""
+        record_size = self._log_record.size
+        chunk_size = record_size * 4096
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(chunk_size)
+            while data:
+                data = data[:len(data) - len(data) % record_size]
+                for key, timestamp, kind in self._log_record.iter_unpack(data):
+                    if kind == self.issued:
+                        self._pending[key] = (timestamp, 0.0)
+                    else:
+                        entry = self._lookup(key)
+                        if entry is not None:
+                            self._pending[key] = (entry[0], timestamp)
+                data = f.read(chunk_size)
+
+    def _merge(self, snapshot: dict):
+        """
+        Writes a new index from the old one and a snapshot of the unmerged records, then swaps it in.
+
+        New records and short runs of old records are collected in a buffer that is written in
+        blocks of about 1 MiB. Runs of more than 1024 old records between the snapshot codes are
+        written straight from the map in slices of at most 1 MiB, so memory use does not depend
+        on the index size.
+        """
+        tmp_path = self.index_path + '.tmp'
+        index_map, index_count = self._index_map, self._index_count
+        size = self._index_record.size
+        offset = self._index_header.size
+        pack = self._index_record.pack
+        buffer = bytearray()
+        count = 0
+        position = 0
+        with open(tmp_path, 'wb') as f:
+            f.write(self._index_header.pack(self.index_magic, self.version, self.width, 0))
+            for key, entry in sorted(snapshot.items()):
+                found = self._position(key, index_map, index_count)
+                if found - position > 1024:
+                    f.write(buffer)
+                    buffer.clear()
+                    self._copy(f, index_map, offset + position * size, offset + found * size)
+                elif found > position:
+                    buffer += index_map[offset + position * size:offset + found * size]
+                buffer += pack(key, *entry)
+                count += found - position + 1
+                position = found
+                start = offset + found * size
+                if found < index_count and index_map[start:start + self.width] == key:
+                    position += 1
+                if len(buffer) >= 1 << 20:
+                    f.write(buffer)
+                    buffer.clear()
+            f.write(buffer)
+            if position < index_count:
+                self._copy(f, index_map, offset + position * size, offset + index_count * size)
+                count += index_count - position
+            f.seek(0)
+            f.write(self._index_header.pack(self.index_magic, self.version, self.width, count))
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._close_index()
+            try:
+                os.replace(tmp_path, self.index_path)
+            finally:
+                self._open_index()
+            self._sync_directory()
+            for key, entry in snapshot.items():
+                if self._pending.get(key) == entry:
+                    del self._pending[key]
+        if os.path.exists(self.old_path):
+            os.unlink(self.old_path)
+            self._sync_directory()
+
+    @staticmethod
+    def _copy(f, index_map, start: int, end: int, block: int = 1 << 20):
+        """Writes a range of the map to a file in slices of at most `block` bytes."""
+        view = memoryview(index_map)
+        try:
+            for position in range(start, end, block):
+                f.write(view[position:min(position + block, end)])
+        finally:
+            view.release()
+
+    def _sync_directory(self):
+        """Flushes renames and removals in the registry directory to disk."""
+        if os.name == 'nt':  # pragma: no cover
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
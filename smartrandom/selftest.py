@@ -0,0 +1,316 @@
+# --------------------------------------------------------
+# Licensed under the terms of the BSD 3-Clause License
+# (see LICENSE for details).
+# Copyright © 2018-2024, A.A Suvorov
+# All rights reserved.
+# --------------------------------------------------------
+# https://github.com/smartlegionlab/
+# --------------------------------------------------------
+"""Randomness quality self-test and throughput profiler."""
+import math
+import os
+import random
+import string
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from .generators import (
+    RandomLetterGenerator,
+    RandomIntegerGenerator,
+    RandomSymbolGenerator,
+    HashGenerator,
+    UrandomGenerator,
+    TextRandomizer,
+    BasePasswordGenerator,
+    PasswordGenerator,
+    SmartPasswordGenerator,
+    SecretCodeGenerator,
+)
+
+HEX_DIGITS = '0123456789abcdef'
+PASSWORD_ALPHABET = BasePasswordGenerator.letters + BasePasswordGenerator.digits + BasePasswordGenerator.symbols
+DIGIT_TEMPLATE = '{' + '|'.join(string.digits) + '}'
+
+GENERATORS = {
+    'RandomLetterGenerator': (
+        RandomLetterGenerator.generate,
+        string.ascii_letters,
+        {'upper': string.ascii_uppercase, 'lower': string.ascii_lowercase},
+    ),
+    'RandomIntegerGenerator': (
+        RandomIntegerGenerator.generate,
+        string.digits,
+        {},
+    ),
+    'RandomSymbolGenerator': (
+        RandomSymbolGenerator.generate,
+        RandomSymbolGenerator.symbols,
+        {},
+    ),
+    'HashGenerator': (
+        lambda length: HashGenerator.generate(UrandomGenerator.generate_string(16)),
+        HEX_DIGITS,
+        {},
+    ),
+    'UrandomGenerator': (
+        lambda length: UrandomGenerator.generate_string(max(1, length // 2)),
+        HEX_DIGITS,
+        {},
+    ),
+    'TextRandomizer': (
+        lambda length: TextRandomizer.randomize(DIGIT_TEMPLATE * length),
+        string.digits,
+        {},
+    ),
+    'BasePasswordGenerator': (
+        BasePasswordGenerator.generate,
+        PASSWORD_ALPHABET,
+        {},
+    ),
+    'PasswordGenerator': (
+        PasswordGenerator.generate,
+        PASSWORD_ALPHABET,
+        {
+            'upper': string.ascii_uppercase,
+            'lower': string.ascii_lowercase,
+            'digits': string.digits,
+            'symbols': PasswordGenerator.symbols,
+        },
+    ),
+    'SmartPasswordGenerator': (
+        lambda length: SmartPasswordGenerator.generate(length=length),
+        PASSWORD_ALPHABET,
+        {},
+    ),
+    'SecretCodeGenerator': (
+        SecretCodeGenerator.generate,
+        SecretCodeGenerator.alphabet,
+        {'upper': string.ascii_uppercase, 'lower': string.ascii_lowercase, 'digits': string.digits},
+    ),
+}
+
+MIN_LENGTHS = {
+    'RandomLetterGenerator': 2,
+    'SecretCodeGenerator': 3,
+    'BasePasswordGenerator': 4,
+    'PasswordGenerator': 4,
+    'SmartPasswordGenerator': 4,
+}
+
+
+def min_length(generators=None) -> int:
+    """
+    Returns the smallest sample length every selected generator accepts.
+
+    :param generators: Names of the generators (default is all of them).
+    :return: Minimum length.
+    """
+    return max(MIN_LENGTHS.get(name, 1) for name in generators or GENERATORS)
+
+
+def run(samples: int = 10000, length: int = 16, workers: int = None, generators=None, chunk: int = 2000) -> dict:
+    """
+    Runs the self-test for the selected generators.
+
+    The sample budget of every generator is split into chunks that are generated and
+    analyzed in parallel worker processes, and the partial statistics are merged.
+
+    `samples_per_worker_second` of a generator is its sample count divided by the generation
+    time summed over all workers, so it is the rate of a single worker, not the aggregate
+    throughput; it is None if the time was too short to measure. `wall_seconds` covers the
+    whole run, including the analysis, for all generators. The report is plain JSON data.
+
+    :param samples: Number of samples per generator (default is 10000).
+    :param length: Length of every sample, where the generator accepts one (default is 16).
+    :param workers: Number of worker processes, 1 runs in-process (default is the number of CPUs).
+        `SmartPasswordGenerator` reseeds the `random` module, so its state is restored after
+        an in-process run.
+    :param generators: Names of the generators to test (default is all of them).
+    :param chunk: Number of samples per task (default is 2000).
+    :raises ValueError: If samples, workers or chunk is less than 1, length is too short for
+        a selected generator, or a generator name is unknown.
+    :return: The report as a dictionary.
+    """
+    if samples < 1 or chunk < 1:
+        raise ValueError("The number of samples and the chunk size must be at least 1.")
+    if workers is not None and workers < 1:
+        raise ValueError("The number of workers must be at least 1.")
+    names = list(generators or GENERATORS)
+    unknown = [name for name in names if name not in GENERATORS]
+    if unknown:
+        raise ValueError(f"Unknown generators: {', '.join(unknown)}.")
+    if length < min_length(names):
+        raise ValueError(f"The length must be at least {min_length(names)} for the selected generators.")
+    workers = workers or os.cpu_count() or 1
+    tasks = []
+    for name in names:
+        for start in range(0, samples, chunk):
+            tasks.append((name, length, min(chunk, samples - start)))
+
+    started = time.perf_counter()
+    if workers == 1:
+        state = random.getstate()
+        try:
+            partials = [_sample(*task) for task in tasks]
+        finally:
+            random.setstate(state)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(_sample, *zip(*tasks)))
+    wall_seconds = time.perf_counter() - started
+
+    merged = {}
+    for name, partial in zip((task[0] for task in tasks), partials):
+        if name in merged:
+            _merge(merged[name], partial)
+        else:
+            merged[name] = partial
+    return {
+        'samples': samples,
+        'length': length,
+        'workers': workers,
+        'wall_seconds': wall_seconds,
+        'generators': {name: _summarize(name, merged[name]) for name in names},
+    }
+
+
+def format_report(report: dict) -> str:
+    """
+    Formats a report as a human-readable table.
+
+    :param report: Report returned by `run`.
+    :return: The table as a string.
+    """
+    lines = [f"{'generator':<24}{'samples/s':>12}{'min chi2 p':>12}{'serial corr':>13}  coverage"]
+    for name, result in report['generators'].items():
+        coverage = ' '.join(f"{key}={value:.3f}" for key, value in result['coverage'].items()) or '-'
+        rate = result['samples_per_worker_second']
+        lines.append(
+            f"{name:<24}{'-' if rate is None else f'{rate:.0f}':>12}"
+            f"{result['chi_square']['min_p_value']:>12.4f}"
+            f"{result['serial_correlation']:>13.5f}  {coverage}"
+        )
+    lines.append(f"{report['samples']} samples per generator, {report['workers']} workers, "
+                 f"{report['wall_seconds']:.2f}s; samples/s is per worker, excluding analysis")
+    return '\n'.join(lines)
+
+
+def chi_square_p_value(statistic: float, degrees: int) -> float:
+    """
+    Approximates the upper tail probability of the chi-square distribution.
+
+    Uses the Wilson-Hilferty transformation to the normal distribution.
+
+    :param statistic: Chi-square statistic.
+    :param degrees: Degrees of freedom.
+    :return: Probability of a statistic at least this large for uniform data.
+    """
+    if degrees < 1:
+        return 1.0
+    variance = 2 / (9 * degrees)
+    z = ((statistic / degrees) ** (1 / 3) - (1 - variance)) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _sample(name: str, length: int, count: int) -> dict:
+    """
+    Generates and analyzes one chunk of samples in a worker.
+
+    :param name: Generator name.
+    :param length: Length of every sample.
+    :param count: Number of samples.
+    :return: Partial statistics that can be merged.
+    """
+    generate, alphabet, classes = GENERATORS[name]
+    started = time.perf_counter()
+    values = [generate(length) for _ in range(count)]
+    seconds = time.perf_counter() - started
+
+    positions = {char: i for i, char in enumerate(alphabet)}
+    frequencies = []
+    sums = [0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    covered = dict.fromkeys(classes, 0)
+    class_sets = {key: set(chars) for key, chars in classes.items()}
+    for value in values:
+        while len(frequencies) < len(value):
+            frequencies.append(Counter())
+        for counter, char in zip(frequencies, value):
+            counter[char] += 1
+        indices = [positions.get(char, -1) for char in value]
+        for x, y in zip(indices, indices[1:]):
+            sums[0] += 1
+            sums[1] += x
+            sums[2] += y
+            sums[3] += x * x
+            sums[4] += y * y
+            sums[5] += x * y
+        chars = set(value)
+        for key, class_set in class_sets.items():
+            if not chars.isdisjoint(class_set):
+                covered[key] += 1
+    return {
+        'count': count,
+        'seconds': seconds,
+        'frequencies': frequencies,
+        'sums': sums,
+        'covered': covered,
+    }
+
+
+def _merge(target: dict, partial: dict):
+    """
+    Adds partial statistics to the accumulated ones.
+
+    :param target: Accumulated statistics, updated in place.
+    :param partial: Statistics of one chunk.
+    """
+    target['count'] += partial['count']
+    target['seconds'] += partial['seconds']
+    for i, counter in enumerate(partial['frequencies']):
+        if i < len(target['frequencies']):
+            target['frequencies'][i].update(counter)
+        else:
+            target['frequencies'].append(counter)
+    target['sums'] = [a + b for a, b in zip(target['sums'], partial['sums'])]
+    for key, value in partial['covered'].items():
+        target['covered'][key] += value
+
+
+def _summarize(name: str, stats: dict) -> dict:
+    """
+    Turns merged statistics into the report entry of a generator.
+
+    :param name: Generator name.
+    :param stats: Merged statistics.
+    :return: Report entry.
+    """
+    _, alphabet, _ = GENERATORS[name]
+    positions = []
+    for counter in stats['frequencies']:
+        total = sum(counter.values())
+        expected = total / len(alphabet)
+        statistic = sum((counter.get(char, 0) - expected) ** 2 / expected for char in alphabet)
+        degrees = len(alphabet) - 1
+        positions.append({
+            'statistic': statistic,
+            'degrees_of_freedom': degrees,
+            'p_value': chi_square_p_value(statistic, degrees),
+            'foreign_characters': sum(count for char, count in counter.items() if char not in alphabet),
+        })
+
+    n, sx, sy, sxx, syy, sxy = stats['sums']
+    denominator = math.sqrt(max(n * sxx - sx * sx, 0) * max(n * syy - sy * sy, 0))
+    correlation = (n * sxy - sx * sy) / denominator if denominator else 0.0
+
+    count = stats['count']
+    return {
+        'samples': count,
+        'samples_per_worker_second': count / stats['seconds'] if stats['seconds'] else None,
+        'chi_square': {
+            'min_p_value': min((position['p_value'] for position in positions), default=1.0),
+            'positions': positions,
+        },
+        'serial_correlation': correlation,
+        'coverage': {key: value / count for key, value in stats['covered'].items()},
+    }
@@ -7,13 +7,53 @@
 # https://github.com/smartlegionlab/
 # --------------------------------------------------------
 import hashlib
+import io
 import re
 
 import pytest
 import string
 from smartrandom import RandomLetterGenerator, RandomIntegerGenerator, RandomSymbolGenerator, HashGenerator, \
     UrandomGenerator, TextRandomizer, SecretCodeGenerator, BasePasswordGenerator, PasswordGenerator, \
-    SmartPasswordGenerator, RandomDataGenerator
+    SmartPasswordGenerator, RandomDataGenerator, CodeVerifier, CodeFormat
+
+
+class TestCodeFormat:
+
+    def test_group(self):
+        code_format = CodeFormat(group=4)
+        assert code_format.apply(list("ABCDEFGHIJ"), string.ascii_uppercase) == "ABCD-EFGH-IJ"
+        assert code_format.apply(list("ABCDEFGH"), string.ascii_uppercase) == "ABCD-EFGH"
+
+    def test_no_group(self):
+        assert CodeFormat().apply(list("ABCD"), string.ascii_uppercase) == "ABCD"
+
+    def test_luhn_decimal(self):
+        code_format = CodeFormat(check='luhn')
+        assert code_format.check_char("7992739871", string.digits) == "3"
+        assert code_format.is_valid("79927398713", string.digits)
+        assert not code_format.is_valid("79927398712", string.digits)
+
+    def test_damm(self):
+        code_format = CodeFormat(check='damm')
+        assert code_format.check_char("572", string.digits) == "4"
+        assert code_format.is_valid("5724", string.digits)
+        assert not code_format.is_valid("5274", string.digits)
+
+    def test_damm_requires_digits(self):
+        with pytest.raises(ValueError, match="alphabet of 10 characters"):
+            CodeFormat(check='damm').check_char("ABC", string.ascii_uppercase)
+
+    def test_invalid_arguments(self):
+        with pytest.raises(ValueError, match="The group size cannot be negative."):
+            CodeFormat(group=-1)
+        with pytest.raises(ValueError, match="The check must be one of"):
+            CodeFormat(check='crc')
+
+    def test_is_valid_rejects_foreign_characters(self):
+        code_format = CodeFormat(group=4)
+        assert code_format.is_valid("ABCD-EFGH", string.ascii_uppercase)
+        assert not code_format.is_valid("ABCD-EFG!", string.ascii_uppercase)
+        assert not code_format.is_valid("", string.ascii_uppercase)
 
 
 class TestRandomLetterGenerator:
@@ -60,6 +100,14 @@ class TestRandomIntegerGenerator:
         results = {RandomIntegerGenerator.generate(length) for _ in range(100)}
         assert len(results) > 1
 
+    def test_generate_with_format(self):
+        code_format = CodeFormat(group=3, separator=' ', check='damm')
+        code = RandomIntegerGenerator.generate(8, code_format)
+        assert re.fullmatch(r"\d{3} \d{3} \d{3}", code)
+        assert RandomIntegerGenerator.validate(code, code_format)
+        typo = code[:-1] + str((int(code[-1]) + 1) % 10)
+        assert not RandomIntegerGenerator.validate(typo, code_format)
+
 
 class TestRandomSymbolGenerator:
 
@@ -104,6 +152,11 @@ class TestHashGenerator:
         hash2 = HashGenerator.generate(text2)
         assert hash1 != hash2
 
+    def test_generate_keyed(self):
+        assert HashGenerator.generate_keyed("text", "key") == HashGenerator.generate_keyed("text", b"key")
+        assert HashGenerator.generate_keyed("text", "key") != HashGenerator.generate_keyed("text", "other")
+        assert HashGenerator.generate_keyed("text", "key") != HashGenerator.generate("text")
+
 
 class TestUrandomGenerator:
 
@@ -152,6 +205,56 @@ class TestTextRandomizer:
         results = {TextRandomizer.randomize(text) for _ in range(100)}
         assert len(results) > 1
 
+    def test_count_variants(self):
+        assert TextRandomizer.count_variants("{Good|Bad} morning, {Alice|Bob|Charlie}!") == 6
+        assert TextRandomizer.count_variants("Hello, World!") == 1
+
+    def test_render_to(self):
+        text = "{Good|Bad} morning, {Alice|Bob|Charlie}!"
+        buffer = io.StringIO()
+        written = TextRandomizer.render_to(text, 1000, buffer, chunk_size=64)
+        lines = buffer.getvalue().splitlines()
+        assert written == len(lines) == 1000
+        assert all(re.fullmatch(r"(Good|Bad) morning, (Alice|Bob|Charlie)!", line) for line in lines)
+        assert len(set(lines)) == 6
+
+    def test_render_to_unique(self):
+        text = "{Good|Bad} morning, {Alice|Bob|Charlie}!"
+        buffer = io.StringIO()
+        TextRandomizer.render_to(text, 6, buffer, unique=True, chunk_size=2)
+        lines = buffer.getvalue().splitlines()
+        assert len(set(lines)) == len(lines) == 6
+
+    def test_render_to_unique_large_template(self):
+        for groups in (6, 30):
+            text = "{0|1|2|3|4|5|6|7|8|9}" * groups
+            buffer = io.StringIO()
+            TextRandomizer.render_to(text, 2000, buffer, unique=True, chunk_size=256)
+            lines = buffer.getvalue().splitlines()
+            assert len(set(lines)) == len(lines) == 2000
+            assert all(len(line) == groups and line.isdigit() for line in lines)
+
+    def test_count_variants_repeated_options(self):
+        assert TextRandomizer.count_variants("{Hi|Hi|Hello}") == 2
+
+    def test_render_to_unique_repeated_options(self):
+        buffer = io.StringIO()
+        TextRandomizer.render_to("{Hi|Hi|Hello}", 2, buffer, unique=True)
+        assert sorted(buffer.getvalue().splitlines()) == ["Hello", "Hi"]
+        with pytest.raises(ValueError, match="only 2 distinct variants"):
+            TextRandomizer.render_to("{Hi|Hi|Hello}", 3, io.StringIO(), unique=True)
+
+    def test_render_to_unique_ambiguous_options(self):
+        buffer = io.StringIO()
+        TextRandomizer.render_to("{a|ab}{bc|c}", 3, buffer, unique=True)
+        assert sorted(buffer.getvalue().splitlines()) == ["abbc", "abc", "ac"]
+        with pytest.raises(ValueError, match="only 3 distinct variants, 4 requested"):
+            TextRandomizer.render_to("{a|ab}{bc|c}", 4, io.StringIO(), unique=True)
+
+    def test_render_to_unique_too_many(self):
+        with pytest.raises(ValueError, match="only 6 distinct variants"):
+            TextRandomizer.render_to("{Good|Bad} morning, {Alice|Bob|Charlie}!", 7, io.StringIO(), unique=True)
+
 
 class TestSecretCodeGenerator:
 
@@ -185,6 +288,52 @@ class TestSecretCodeGenerator:
         codes = {SecretCodeGenerator.generate() for _ in range(1000)}
         assert len(codes) > 900
 
+    def test_generate_with_format(self):
+        code_format = CodeFormat(group=4, check='luhn')
+        for _ in range(100):
+            code = SecretCodeGenerator.generate(16, code_format)
+            assert re.fullmatch(r"([A-Za-z0-9]{4}-){4}[A-Za-z0-9]", code)
+            assert SecretCodeGenerator.validate(code, code_format)
+            for i, char in enumerate(code):
+                if char != '-':
+                    typo = code[:i] + ('A' if char != 'A' else 'B') + code[i + 1:]
+                    assert not SecretCodeGenerator.validate(typo, code_format)
+
+
+class TestCodeVerifier:
+
+    def test_verify(self):
+        assert CodeVerifier.verify("Ab3dE9", "Ab3dE9")
+        assert not CodeVerifier.verify("Ab3dE9", "ab3de9")
+        assert not CodeVerifier.verify("Ab3dE9", "Ab3dE")
+
+    def test_verify_separators(self):
+        assert CodeVerifier.verify("ABCD-EFGH", "ABCD EFGH")
+        assert CodeVerifier.verify("123456", "123-456")
+        assert not CodeVerifier.verify("123456", "123.456")
+        assert CodeVerifier.verify("123456", "123.456", separators=".")
+
+    def test_verify_ignore_case(self):
+        assert CodeVerifier.verify("ABCD-EFGH", "abcd efgh", ignore_case=True)
+        assert not CodeVerifier.verify("ABCD-EFGH", "abcd efgi", ignore_case=True)
+
+    def test_verify_non_ascii(self):
+        assert not CodeVerifier.verify("123456", "12345ё")
+
+    def test_verify_many(self):
+        pairs = [("123456", "123-456"), ("123456", "654321"), ("ABC", "abc")]
+        assert CodeVerifier.verify_many(pairs) == [True, False, False]
+        assert CodeVerifier.verify_many(pairs, ignore_case=True) == [True, False, True]
+
+    def test_verify_hash(self):
+        code = SecretCodeGenerator.generate(16)
+        stored = CodeVerifier.hash(code, "key")
+        assert code not in stored
+        assert CodeVerifier.verify_hash(stored, code, "key")
+        assert CodeVerifier.verify_hash(stored, code[:8] + "-" + code[8:], "key")
+        assert not CodeVerifier.verify_hash(stored, code, "other")
+        assert not CodeVerifier.verify_hash(stored, code[::-1], "key")
+
 
 class TestBasePasswordGenerator:
 
@@ -0,0 +1,144 @@
+# --------------------------------------------------------
+# Licensed under the terms of the BSD 3-Clause License
+# (see LICENSE for details).
+# Copyright © 2018-2024, A.A. Suvorov
+# All rights reserved.
+# --------------------------------------------------------
+# https://github.com/smartlegionlab/
+# --------------------------------------------------------
+import os
+
+import pytest
+from smartrandom import CodeRegistry
+
+
+class TestCodeRegistry:
+
+    def test_issue_and_contains(self, tmp_path):
+        with CodeRegistry(str(tmp_path / 'codes')) as registry:
+            code = registry.issue()
+            assert len(code) == 10
+            assert registry.contains(code)
+            assert registry.issued_at(code) is not None
+            assert not registry.contains('missing')
+            assert registry.issued_at('missing') is None
+
+    def test_issue_duplicate(self, tmp_path):
+        with CodeRegistry(str(tmp_path / 'codes')) as registry:
+            registry.issue('ABC123')
+            with pytest.raises(ValueError, match="has already been issued"):
+                registry.issue('ABC123')
+
+    def test_issue_too_long(self, tmp_path):
+        with CodeRegistry(str(tmp_path / 'codes'), width=4) as registry:
+            with pytest.raises(ValueError, match="1 to 4 bytes"):
+                registry.issue('ABCDE')
+            assert not registry.contains('ABCDE')
+
+    def test_redeem(self, tmp_path):
+        with CodeRegistry(str(tmp_path / 'codes')) as registry:
+            registry.issue('ABC123')
+            assert registry.redeemed_at('ABC123') is None
+            assert registry.redeem('ABC123')
+            assert not registry.redeem('ABC123')
+            assert not registry.redeem('missing')
+            assert registry.redeemed_at('ABC123') is not None
+
+    def test_persistence(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        with CodeRegistry(path) as registry:
+            registry.issue('ABC123')
+            registry.issue('XYZ789')
+            registry.redeem('XYZ789')
+            issued_at = registry.issued_at('ABC123')
+        with CodeRegistry(path) as registry:
+            assert len(registry) == 2
+            assert registry.issued_at('ABC123') == issued_at
+            assert registry.redeem('ABC123')
+            assert not registry.redeem('XYZ789')
+
+    def test_compaction(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        with CodeRegistry(path, compact_threshold=16, sync=False) as registry:
+            codes = [registry.issue() for _ in range(100)]
+            registry.redeem(codes[0])
+            registry.compact()
+            assert os.path.getsize(path) == 8
+            assert len(registry) == 100
+        with CodeRegistry(path) as registry:
+            assert all(registry.contains(code) for code in codes)
+            assert not registry.redeem(codes[0])
+            assert registry.redeem(codes[1])
+
+    def test_torn_append(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        with CodeRegistry(path) as registry:
+            registry.issue('ABC123')
+        with open(path, 'ab') as f:
+            f.write(b'XYZ')
+        with CodeRegistry(path) as registry:
+            assert registry.contains('ABC123')
+            registry.issue('XYZ789')
+        with CodeRegistry(path) as registry:
+            assert registry.contains('XYZ789')
+
+    def test_width_mismatch(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        CodeRegistry(path).close()
+        with pytest.raises(ValueError, match="width 32"):
+            CodeRegistry(path, width=16)
+
+    def test_invalid_compact_threshold(self, tmp_path):
+        with pytest.raises(ValueError, match="The compaction threshold must be at least 1."):
+            CodeRegistry(str(tmp_path / 'codes'), compact_threshold=0)
+
+    def test_exclusive_open(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        with CodeRegistry(path) as registry:
+            registry.issue('ABC123')
+            with pytest.raises(RuntimeError, match="is already open"):
+                CodeRegistry(path)
+            assert registry.redeem('ABC123')
+        with CodeRegistry(path) as registry:
+            assert not registry.redeem('ABC123')
+
+    def test_background_compaction(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        with CodeRegistry(path, compact_threshold=16, sync=False) as registry:
+            codes = [registry.issue() for _ in range(500)]
+            assert all(registry.redeem(code) for code in codes[::2])
+            assert all(registry.contains(code) for code in codes)
+        assert not os.path.exists(path + '.old')
+        with CodeRegistry(path) as registry:
+            assert len(registry) == 500
+            assert not any(registry.redeem(code) for code in codes[::2])
+            assert all(registry.redeem(code) for code in codes[1::2])
+
+    def test_interrupted_compaction(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        with CodeRegistry(path) as registry:
+            registry.issue('ABC123')
+            registry.issue('XYZ789')
+        os.replace(path, path + '.old')
+        with CodeRegistry(path) as registry:
+            assert not os.path.exists(path + '.old')
+            assert registry.contains('ABC123')
+            registry.redeem('XYZ789')
+        with CodeRegistry(path) as registry:
+            assert len(registry) == 2
+            assert registry.redeemed_at('XYZ789') is not None
+
+    def test_compaction_copies_long_runs(self, tmp_path):
+        path = str(tmp_path / 'codes')
+        with CodeRegistry(path, compact_threshold=100000, sync=False) as registry:
+            for i in range(0, 6000, 2):
+                registry.issue(f'C{i:05d}')
+            registry.compact()
+            for i in (1, 2999, 5999):
+                registry.issue(f'C{i:05d}')
+            registry.compact()
+            assert len(registry) == 3003
+        with CodeRegistry(path) as registry:
+            assert all(registry.contains(f'C{i:05d}') for i in range(0, 6000, 2))
+            assert all(registry.contains(f'C{i:05d}') for i in (1, 2999, 5999))
+            assert not registry.contains('C00003')
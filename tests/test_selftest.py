@@ -0,0 +1,94 @@
+# --------------------------------------------------------
+# Licensed under the terms of the BSD 3-Clause License
+# (see LICENSE for details).
+# Copyright © 2018-2024, A.A. Suvorov
+# All rights reserved.
+# --------------------------------------------------------
+# https://github.com/smartlegionlab/
+# --------------------------------------------------------
+import json
+import random
+
+import pytest
+from smartrandom import selftest
+from smartrandom.__main__ import main
+
+
+class TestSelftest:
+
+    def test_run_all_generators(self):
+        report = selftest.run(samples=200, length=8, workers=1, chunk=64)
+        assert set(report['generators']) == set(selftest.GENERATORS)
+        for result in report['generators'].values():
+            assert result['samples_per_worker_second'] is None or result['samples_per_worker_second'] > 0
+            assert 0 <= result['chi_square']['min_p_value'] <= 1
+            assert -1 <= result['serial_correlation'] <= 1
+
+    def test_run_statistics(self):
+        report = selftest.run(samples=500, length=8, workers=1, generators=['SecretCodeGenerator'])
+        result = report['generators']['SecretCodeGenerator']
+        assert len(result['chi_square']['positions']) == 8
+        assert result['chi_square']['positions'][0]['degrees_of_freedom'] == 61
+        assert all(position['foreign_characters'] == 0 for position in result['chi_square']['positions'])
+        assert result['coverage'] == {'upper': 1.0, 'lower': 1.0, 'digits': 1.0}
+
+    def test_run_in_worker_processes(self):
+        names = ['SecretCodeGenerator', 'PasswordGenerator']
+        report = selftest.run(samples=300, length=8, workers=2, generators=names, chunk=64)
+        assert report['workers'] == 2
+        for name in names:
+            result = report['generators'][name]
+            assert result['samples'] == 300
+            assert len(result['chi_square']['positions']) == 8
+            assert all(value == 1.0 for value in result['coverage'].values())
+        assert set(report['generators']['PasswordGenerator']['coverage']) == {'upper', 'lower', 'digits', 'symbols'}
+
+    def test_run_keeps_random_state(self):
+        random.seed(42)
+        expected = random.random()
+        random.seed(42)
+        selftest.run(samples=10, workers=1, generators=['SmartPasswordGenerator'])
+        assert random.random() == expected
+
+    def test_run_unknown_generator(self):
+        with pytest.raises(ValueError, match="Unknown generators: Missing."):
+            selftest.run(samples=10, workers=1, generators=['Missing'])
+
+    def test_run_invalid_samples(self):
+        with pytest.raises(ValueError, match="must be at least 1"):
+            selftest.run(samples=0, workers=1)
+
+    def test_run_invalid_length(self):
+        with pytest.raises(ValueError, match="at least 4"):
+            selftest.run(samples=10, length=3, workers=1)
+        report = selftest.run(samples=10, length=3, workers=1, generators=['SecretCodeGenerator'])
+        assert report['length'] == 3
+
+    def test_chi_square_p_value(self):
+        assert selftest.chi_square_p_value(9, 9) == pytest.approx(0.437, abs=0.01)
+        assert selftest.chi_square_p_value(30, 9) < 0.001
+        assert selftest.chi_square_p_value(0, 0) == 1.0
+
+    def test_main_writes_report(self, tmp_path, capsys):
+        output = tmp_path / 'report.json'
+        status = main(['selftest', '-n', '100', '-w', '1', '-g', 'RandomIntegerGenerator', '-o', str(output)])
+        assert status == 0
+        assert 'RandomIntegerGenerator' in capsys.readouterr().out
+        report = json.loads(output.read_text(), parse_constant=pytest.fail)
+        assert list(report['generators']) == ['RandomIntegerGenerator']
+
+    def test_main_without_command(self, capsys):
+        assert main([]) == 1
+        assert 'selftest' in capsys.readouterr().out
+
+    @pytest.mark.parametrize('argv, message', [
+        (['selftest', '-l', '3'], 'the length must be at least 4'),
+        (['selftest', '-l', '1', '-g', 'RandomLetterGenerator'], 'the length must be at least 2'),
+        (['selftest', '-n', '0'], 'the number of samples must be at least 1'),
+        (['selftest', '-w', '0'], 'the number of workers must be at least 1'),
+    ])
+    def test_main_invalid_arguments(self, argv, message, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(argv)
+        assert exc_info.value.code == 2
+        assert message in capsys.readouterr().err